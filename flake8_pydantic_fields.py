@@ -1,9 +1,12 @@
 import ast
-from typing import Any, Iterable
+import weakref
+from typing import Any, Iterable, Iterator
 
 VERSION = "0.1.9"
-PYDANTIC_MODEL_BASES = ["BaseModel", "GenericModel"]
-VALIDATOR_DECORATOR_NAMES = ["validator", "root_validator"]
+PYDANTIC_MODEL_BASES = frozenset({"BaseModel", "GenericModel"})
+VALIDATOR_DECORATOR_NAMES = frozenset({"validator", "root_validator"})
+FIELD_FUNCTION_NAMES = frozenset({"Field", "field"})
+STATEMENT_BLOCK_FIELDS = ("body", "orelse", "handlers", "finalbody", "cases")
 ERRORS = {
     "PF001": "PF001 Found a Pydantic field which has no default",
     "PF002": "PF002 Found a Pydantic field which has a default that is not a Field",
@@ -11,244 +14,275 @@ ERRORS = {
     "PF004": "PF004 Found a Pydantic field which has a Field default with an empty description",
 }
 
+# Node types bound at module level, so each check is a single global lookup.
+# The parser only ever creates these exact types, so checks use identity
+# rather than isinstance.
+_AnnAssign = ast.AnnAssign
+_Name = ast.Name
+_Attribute = ast.Attribute
+_Call = ast.Call
+_FunctionDef = ast.FunctionDef
+_AsyncFunctionDef = ast.AsyncFunctionDef
+_ClassDef = ast.ClassDef
+_Constant = ast.Constant
+_Subscript = ast.Subscript
+
+# Nodes whose blocks can hold a class or a field. Every other statement, such
+# as an import, a plain assignment or a function, is never pushed onto the walk.
+_BLOCK_TYPES = frozenset(
+    {
+        ast.ClassDef,
+        ast.If,
+        ast.For,
+        ast.AsyncFor,
+        ast.While,
+        ast.With,
+        ast.AsyncWith,
+        ast.Try,
+        ast.ExceptHandler,
+        ast.Match,
+        ast.match_case,
+    }
+    | ({ast.TryStar} if hasattr(ast, "TryStar") else set())
+)
+
+# Error codes already found for a tree, dropped once flake8 releases the tree.
+_ERRORS_BY_TREE: weakref.WeakKeyDictionary[
+    ast.Module, tuple[tuple[int, int, str], ...]
+] = weakref.WeakKeyDictionary()
+
 
 def has_dataclass_decorator(*, classdef: ast.ClassDef) -> bool:
     for decorator in classdef.decorator_list:
-        if isinstance(decorator, ast.Name):
+        if type(decorator) is _Name:
             if decorator.id == "dataclass":
                 return True
-        elif isinstance(decorator, ast.Attribute):
+        elif type(decorator) is _Attribute:
             if decorator.attr == "dataclass":
                 return True
 
     return False
 
 
-def has_base_class(*, classdef: ast.ClassDef) -> bool:
-    """Must have at least a base class to be a candidate to be a data model."""
-    return len(classdef.bases) > 0
-
-
 def base_class_indicates_pydantic(*, classdef: ast.ClassDef) -> bool:
     """If the base class is obviously from Pydantic, it is."""
-    return any(
-        pydantic_model_base in base.id
-        for pydantic_model_base in PYDANTIC_MODEL_BASES
-        for base in classdef.bases
-        if isinstance(base, ast.Name)
-    )
-
+    for base in classdef.bases:
+        if type(base) is _Name and base.id in PYDANTIC_MODEL_BASES:
+            return True
 
-def class_contains_only_annassign(*, classdef: ast.ClassDef) -> bool:
-    """If a class has no methods, it must be a data model."""
-    return all(isinstance(node, ast.AnnAssign) for node in classdef.body)
+    return False
 
 
-def has_inner_config_class(*, classdef: ast.ClassDef) -> bool:
-    """If a class has an inner Config class, it must be Pydantic."""
-    return any(
-        isinstance(attribute, ast.ClassDef) and attribute.name == "Config"
-        for attribute in classdef.body
-    )
+def is_classvar_annotation(*, annotation: ast.expr) -> bool:
+    """If an attribute is annotated as a ClassVar, it is not a field."""
+    if type(annotation) is _Subscript:
+        annotation = annotation.value
+    return type(annotation) is _Name and annotation.id == "ClassVar"
+
+
+def is_validator_decorator(*, decorator: ast.expr) -> bool:
+    """Matches @validator, @root_validator, and their called or dotted forms."""
+    if type(decorator) is _Name:
+        return decorator.id in VALIDATOR_DECORATOR_NAMES
+    if type(decorator) is _Attribute:
+        return decorator.attr in VALIDATOR_DECORATOR_NAMES
+    if type(decorator) is _Call:
+        func = decorator.func
+        if type(func) is _Name:
+            return func.id in VALIDATOR_DECORATOR_NAMES
+        if type(func) is _Attribute:
+            return func.attr in VALIDATOR_DECORATOR_NAMES
+    return False
 
 
-def no_methods_have_arguments(*, classdef: ast.ClassDef) -> bool:
-    """If a class has no methods with arguments, it must be a data model."""
-    for attribute in classdef.body:
-        if isinstance(attribute, (ast.FunctionDef, ast.AsyncFunctionDef)):
-            non_self_args = [
-                arg for arg in attribute.args.args if arg.arg != "self"
-            ]
-            if len(non_self_args) > 0:
-                return False
-
-    return True
-
-
-def has_classvar_attribute(*, classdef: ast.ClassDef) -> bool:
-    """If a class has a ClassVar attribute, it must be Pydantic."""
-    return any(
-        isinstance(attribute, ast.AnnAssign)
-        and isinstance(attribute.annotation, ast.Subscript)
-        and isinstance(attribute.annotation.value, ast.Name)
-        and attribute.annotation.value.id.startswith("ClassVar")
-        or isinstance(attribute, ast.AnnAssign)
-        and isinstance(attribute.annotation, ast.Name)
-        and attribute.annotation.id.startswith("ClassVar")
-        for attribute in classdef.body
+def is_relationship_default(*, annassign: ast.AnnAssign) -> bool:
+    """If an attribute's default is a Relationship, then it is likely SQLAlchemy."""
+    return (
+        type(annassign.value) is _Call
+        and type(annassign.value.func) is _Name
+        and annassign.value.func.id == "Relationship"
     )
 
 
-def has_validator_method(*, classdef: ast.ClassDef) -> bool:
-    """If a class has a method which is decorated
-    with @validator or @root_validator, it must be Pydantic.
-    """
-    for attribute in classdef.body:
-        if not isinstance(attribute, (ast.FunctionDef, ast.AsyncFunctionDef)):
-            continue
-        for decorator in attribute.decorator_list:
-            if (
-                isinstance(decorator, ast.Name)
-                and decorator.id in VALIDATOR_DECORATOR_NAMES
-            ):
-                return True
-            if (
-                isinstance(decorator, ast.Attribute)
-                and decorator.attr in VALIDATOR_DECORATOR_NAMES
-            ):
-                return True
-            if (
-                isinstance(decorator, ast.Call)
-                and isinstance(decorator.func, ast.Attribute)
-                and decorator.func.attr in VALIDATOR_DECORATOR_NAMES
-            ):
-                return True
-            if (
-                isinstance(decorator, ast.Call)
-                and isinstance(decorator.func, ast.Name)
-                and decorator.func.id in VALIDATOR_DECORATOR_NAMES
-            ):
-                return True
+def is_typeddict(*, classdef: ast.ClassDef) -> bool:
+    """If a class has a TypedDict base class, it is not a data model."""
+    for base in classdef.bases:
+        if type(base) is _Name and base.id == "TypedDict":
+            return True
 
     return False
 
 
-def has_relationship_default(*, classdef: ast.ClassDef) -> bool:
-    """If a class has an attribute whose default is a Relationship, then it is likely SQLAlchemy."""
+def scan_class_body(
+    *, classdef: ast.ClassDef
+) -> tuple[
+    list[ast.AnnAssign], list[ast.FunctionDef | ast.AsyncFunctionDef], list[ast.stmt]
+]:
+    """Sort the class body into annotated assignments, methods, and the rest."""
+    annassigns: list[ast.AnnAssign] = []
+    methods: list[ast.FunctionDef | ast.AsyncFunctionDef] = []
+    others: list[ast.stmt] = []
     for attribute in classdef.body:
-        if (
-            isinstance(attribute, ast.AnnAssign)
-            and isinstance(attribute.value, ast.Call)
-            and isinstance(attribute.value.func, ast.Name)
-            and attribute.value.func.id == "Relationship"
-        ):
+        if type(attribute) is _AnnAssign:
+            annassigns.append(attribute)
+        elif type(attribute) is _FunctionDef or type(attribute) is _AsyncFunctionDef:
+            methods.append(attribute)
+        else:
+            others.append(attribute)
+
+    return annassigns, methods, others
+
+
+def has_statement_blocks(*, statements: list[ast.stmt]) -> bool:
+    """Whether any statement other than a nested class holds a block of statements."""
+    for statement in statements:
+        if type(statement) is not _ClassDef and type(statement) in _BLOCK_TYPES:
             return True
 
     return False
 
 
-def has_init(*, classdef: ast.ClassDef) -> bool:
-    """If a class has an __init__ method, it is not a data model."""
-    for attribute in classdef.body:
-        if (
-            isinstance(attribute, (ast.FunctionDef, ast.AsyncFunctionDef))
-            and attribute.name == "__init__"
-        ):
+def is_model_candidate(
+    *,
+    classdef: ast.ClassDef,
+    annassigns: list[ast.AnnAssign],
+    methods: list[ast.FunctionDef | ast.AsyncFunctionDef],
+    others: list[ast.stmt],
+) -> bool:
+    """Apply the data model heuristics to a class body sorted by scan_class_body.
+
+    Cheap disqualifiers on the bases and decorators are checked first, then an
+    __init__ method or a Relationship default, before any qualifier.
+    """
+    if (
+        not classdef.bases
+        or is_typeddict(classdef=classdef)
+        or has_dataclass_decorator(classdef=classdef)
+    ):
+        return False
+
+    for method in methods:
+        if method.name == "__init__":
+            return False
+    for annassign in annassigns:
+        if is_relationship_default(annassign=annassign):
+            return False
+
+    if base_class_indicates_pydantic(classdef=classdef):
+        return True
+    if not methods and not others:
+        return True
+
+    for annassign in annassigns:
+        if is_classvar_annotation(annotation=annassign.annotation):
+            return True
+    for other in others:
+        if type(other) is _ClassDef and other.name == "Config":
             return True
 
-    return False
+    has_method_with_arguments = False
+    for method in methods:
+        for decorator in method.decorator_list:
+            if is_validator_decorator(decorator=decorator):
+                return True
+        if not has_method_with_arguments:
+            for arg in method.args.args:
+                if arg.arg != "self":
+                    has_method_with_arguments = True
+                    break
 
+    return not has_method_with_arguments
 
-def is_typeddict(*, classdef: ast.ClassDef) -> bool:
-    """If a class has a TypedDict base class, it is not a data model."""
-    return any(
-        isinstance(base, ast.Name) and base.id == "TypedDict"
-        for base in classdef.bases
-    )
 
+def find_field_error(*, annassign: ast.AnnAssign) -> str | None:
+    """Return the error code for an annotated assignment in a candidate class."""
+    if is_classvar_annotation(annotation=annassign.annotation):
+        return None
 
-class PydanticFieldChecker(ast.NodeVisitor):
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        super().__init__(*args, **kwargs)
-        self.current_class_is_candidate = False
-        self.errors: list[tuple[int, int, str]] = []
-
-    def visit_ClassDef(self, node: ast.ClassDef) -> None:
-        self.current_class_is_candidate = (
-            has_base_class(classdef=node)
-            and (
-                base_class_indicates_pydantic(classdef=node)
-                or class_contains_only_annassign(classdef=node)
-                or has_validator_method(classdef=node)
-                or has_inner_config_class(classdef=node)
-                or has_classvar_attribute(classdef=node)
-                or no_methods_have_arguments(classdef=node)
-            )
-            and not (
-                has_init(classdef=node)
-                or has_dataclass_decorator(classdef=node)
-                or has_relationship_default(classdef=node)
-                or is_typeddict(classdef=node)
-            )
-        )
-        self.generic_visit(node)
-        self.current_class_is_candidate = False
-
-    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
-        self.current_class_is_candidate = False
-
-    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> None:
-        self.current_class_is_candidate = False
-
-    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
-        is_classvar = (
-            isinstance(node.annotation, ast.Subscript)
-            and isinstance(node.annotation.value, ast.Name)
-            and node.annotation.value.id.startswith("ClassVar")
-        ) or (isinstance(node.annotation, ast.Name) and node.annotation.id == "ClassVar")
-
-        is_privateattr = (
-            isinstance(node.value, ast.Call)
-            and isinstance(node.value.func, ast.Name)
-            and node.value.func.id == "PrivateAttr"
-        )
-
-        if self.current_class_is_candidate and not is_classvar and not is_privateattr:
-            if node.value is None:
-                self.errors.append(
-                    (
-                        node.lineno,
-                        node.col_offset,
-                        ERRORS["PF001"],
-                    )
-                )
-            elif (
-                isinstance(node.value, ast.Call)
-                and isinstance(node.value.func, ast.Name)
-                and node.value.func.id.lower() != "field"
-            ) or not isinstance(node.value, ast.Call):
-                self.errors.append(
-                    (
-                        node.lineno,
-                        node.col_offset,
-                        ERRORS["PF002"],
-                    )
-                )
-            elif (
-                isinstance(node.value, ast.Call)
-                and isinstance(node.value.func, ast.Name)
-                and node.value.func.id.lower() == "field"
-                and not any(
-                    keyword.arg == "description" for keyword in node.value.keywords
-                )
-            ):
-                self.errors.append(
-                    (
-                        node.lineno,
-                        node.col_offset,
-                        ERRORS["PF003"],
-                    )
-                )
-            elif (
-                isinstance(node.value, ast.Call)
-                and isinstance(node.value.func, ast.Name)
-                and node.value.func.id.lower() == "field"
-                and any(
-                    keyword.arg == "description"
-                    and isinstance(keyword.value, ast.Constant)
-                    and keyword.value.value == ""
-                    for keyword in node.value.keywords
-                )
+    value = annassign.value
+    if value is None:
+        return "PF001"
+    if type(value) is not _Call:
+        return "PF002"
+
+    func = value.func
+    if type(func) is not _Name or func.id == "PrivateAttr":
+        return None
+    if func.id not in FIELD_FUNCTION_NAMES:
+        return "PF002"
+
+    for keyword in value.keywords:
+        if keyword.arg == "description":
+            description = keyword.value
+            if type(description) is _Constant and description.value == "":
+                return "PF004"
+            return None
+
+    return "PF003"
+
+
+def _check_tree(tree: ast.Module) -> list[tuple[int, int, str]]:
+    """Walk the statement blocks of the module with an explicit stack.
+
+    Each statement is paired with whether it sits directly in a candidate
+    class. Only classes, blocks that may hold them, and annotated assignments
+    in candidate classes are pushed, so function bodies are never entered and
+    most module-level statements are skipped without being looked at again.
+    """
+    errors: list[tuple[int, int, str]] = []
+    append = errors.append
+    stack: list[tuple[ast.AST, bool]] = []
+
+    def push(block: list[Any], in_candidate_class: bool) -> None:
+        for child in reversed(block):
+            child_type = type(child)
+            if child_type in _BLOCK_TYPES or (
+                in_candidate_class and child_type is _AnnAssign
             ):
-                self.errors.append(
-                    (
-                        node.lineno,
-                        node.col_offset,
-                        ERRORS["PF004"],
-                    )
+                stack.append((child, in_candidate_class))
+
+    push(tree.body, False)
+    while stack:
+        node, in_candidate_class = stack.pop()
+        if type(node) is _AnnAssign:
+            code = find_field_error(annassign=node)
+            if code is not None:
+                append((node.lineno, node.col_offset, code))
+            continue
+
+        if type(node) is _ClassDef:
+            annassigns, methods, others = scan_class_body(classdef=node)
+            # A class with no annotated assignments, even within a block such as
+            # `if TYPE_CHECKING:`, cannot report anything, so skip the heuristics.
+            in_candidate_class = False
+            if annassigns or has_statement_blocks(statements=others):
+                in_candidate_class = is_model_candidate(
+                    classdef=node, annassigns=annassigns, methods=methods, others=others
                 )
+            if in_candidate_class:
+                for annassign in annassigns:
+                    code = find_field_error(annassign=annassign)
+                    if code is not None:
+                        append((annassign.lineno, annassign.col_offset, code))
+            push(others, in_candidate_class)
+            continue
+
+        for field in STATEMENT_BLOCK_FIELDS:
+            block = getattr(node, field, None)
+            if block:
+                push(block, in_candidate_class)
+
+    return errors
 
-        self.generic_visit(node)
+
+def check(tree: ast.Module) -> Iterator[tuple[int, int, str, str]]:
+    """Yield flake8 results for a module, reusing any already found for the tree."""
+    errors = _ERRORS_BY_TREE.get(tree)
+    if errors is None:
+        errors = _ERRORS_BY_TREE[tree] = tuple(_check_tree(tree))
+
+    for line, col, code in errors:
+        yield line, col, ERRORS[code], ""
 
 
 class Plugin:
@@ -259,8 +293,4 @@ class Plugin:
         self.tree = tree
 
     def run(self) -> Iterable[tuple[int, int, str, str]]:
-        visitor = PydanticFieldChecker()
-        visitor.visit(self.tree)
-
-        for line, col, msg in visitor.errors:
-            yield line, col, msg, ""
+        return check(self.tree)
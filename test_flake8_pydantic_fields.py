@@ -1,433 +1,439 @@
 import ast
-import inspect
-
-from flake8_pydantic_fields import Plugin
-
-
-def test_fields_with_descriptions_no_errors() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(BaseModel):
-            foo: str = Field(..., description="foo")
-            bar: str = Field(..., description="bar")
-        """
+import functools
+from typing import Sequence
+
+import pytest
+
+import flake8_pydantic_fields
+from flake8_pydantic_fields import (
+    FIELD_FUNCTION_NAMES,
+    PYDANTIC_MODEL_BASES,
+    VALIDATOR_DECORATOR_NAMES,
+    Plugin,
+    check,
+    is_model_candidate,
+    scan_class_body,
+)
+
+PF001_MESSAGE = "PF001 Found a Pydantic field which has no default"
+PF002_MESSAGE = "PF002 Found a Pydantic field which has a default that is not a Field"
+PF003_MESSAGE = (
+    "PF003 Found a Pydantic field which has a Field default with no description"
+)
+PF004_MESSAGE = (
+    "PF004 Found a Pydantic field which has a Field default with an empty description"
+)
+
+# Most tests report a single error on the third line of their source.
+ERR_PF001 = (3, 4, PF001_MESSAGE, "")
+ERR_PF002 = (3, 4, PF002_MESSAGE, "")
+ERR_PF003 = (3, 4, PF003_MESSAGE, "")
+ERR_PF004 = (3, 4, PF004_MESSAGE, "")
+
+EXPECTED_NONE: tuple[tuple[int, int, str, str], ...] = ()
+EXPECTED_PF001 = (ERR_PF001,)
+EXPECTED_PF002 = (ERR_PF002,)
+EXPECTED_PF003 = (ERR_PF003,)
+EXPECTED_PF004 = (ERR_PF004,)
+
+
+@functools.lru_cache(maxsize=None)
+def parse(source: str) -> ast.Module:
+    """Parse each distinct source once, sharing the tree between tests.
+
+    The plugin never mutates the tree, so sharing it is safe. Sources are
+    parsed with the grammar of the oldest supported Python.
+    """
+    return ast.parse(source, feature_version=(3, 10))
+
+
+def assert_errors(
+    tree: ast.Module, expected: Sequence[tuple[int, int, str, str]]
+) -> None:
+    """Assert the check reports exactly the expected errors, without collecting them."""
+    errors = check(tree)
+    for error in expected:
+        assert next(errors, None) == error
+    assert next(errors, None) is None
+
+
+SRC_FIELDS_WITH_DESCRIPTIONS = """\
+class MyModel(BaseModel):
+    foo: str = Field(..., description="foo")
+    bar: str = Field(..., description="bar")
+"""
+
+SRC_FIELD_WITH_NO_DEFAULT = """\
+class MyModel(BaseModel):
+    bar: str
+"""
+
+SRC_FIELD_WITH_NON_FIELD_DEFAULT = """\
+class MyModel(BaseModel):
+    foo: str = Field(..., description="foo")
+    bar: str = "bar"
+"""
+
+SRC_LOWERCASE_FIELD_DEFAULT = """\
+class MyModel(BaseModel):
+    foo: str = field(..., description="foo")
+    bar: str = field(...)
+"""
+
+SRC_FIELD_WITH_MISSING_DESCRIPTION = """\
+class MyModel(BaseModel):
+    foo: str = Field(..., description="foo")
+    bar: str = Field(...)
+"""
+
+SRC_FIELD_WITH_EMPTY_DESCRIPTION = """\
+class MyModel(BaseModel):
+    foo: str = Field(..., description="foo")
+    bar: str = Field(..., description="")
+"""
+
+SRC_CLASSVAR = """\
+class MyModel(BaseModel):
+    foo: ClassVar[str]
+    bar: str = Field(..., description="description")
+"""
+
+SRC_CLASSVAR_PREFIXED_ANNOTATION = """\
+class MyModel(BaseModel):
+    foo: ClassVarLike[str]
+"""
+
+SRC_PRIVATEATTR = """\
+class MyModel(BaseModel):
+    foo: str = PrivateAttr(default=None)
+    bar: str = Field(..., description="description")
+"""
+
+SRC_GENERIC_MODEL = """\
+class MyModel(GenericModel):
+    foo: str = Field(..., description="foo")
+    bar: str
+"""
+
+SRC_BASE_CLASS_CONTAINING_PYDANTIC_NAME = """\
+class MyFactory(BaseModelFactory):
+    bar: str
+
+    def build(self, value):
+        return value
+"""
+
+SRC_TYPEDDICT = """\
+class MyModel(TypedDict):
+    foo: str
+    bar: str
+"""
+
+SRC_CUSTOM_BASE_CLASS_NO_METHODS = """\
+class MyModel(MyBase):
+    foo: str = Field(..., description="foo")
+    bar: str
+"""
+
+SRC_CUSTOM_BASE_CLASS_WITH_VALIDATORS = """\
+class MyModel(MyBase):
+    foo: str = Field(..., description="foo")
+    bar: str
+
+    @validator("foo")
+    def f(cls, v):
+        return v
+"""
+
+SRC_CUSTOM_BASE_CLASS_WITH_PYDANTIC_VALIDATORS = """\
+class MyModel(MyBase):
+    foo: str = Field(..., description="foo")
+    bar: str
+
+    @pydantic.validator("foo")
+    def f(cls, v):
+        return v
+"""
+
+SRC_CUSTOM_BASE_CLASS_WITH_CONFIG_CLASS = """\
+class MyModel(MyBase):
+    foo: str = Field(..., description="foo")
+    bar: str
+
+    class Config:
+        pass
+"""
+
+SRC_CUSTOM_BASE_CLASS_WITH_CONFIG_CLASS_WITH_VALIDATORS = """\
+class MyModel(MyBase):
+    foo: str = Field(..., description="foo")
+    bar: str
+
+    class Config:
+        @validator("foo")
+        def f(cls, v):
+            return v
+"""
+
+SRC_CUSTOM_BASE_CLASS_WITH_UNINITIALIZED_CLASSVAR = """\
+class MyModel(MyBase):
+    baz: ClassVar[str]
+    foo: str = Field(..., description="foo")
+    bar: str
+
+    def method(self) -> None:
+        ...
+
+    @property
+    def myprop(self) -> str:
+        return "myprop"
+"""
+
+SRC_CUSTOM_BASE_CLASS_WITH_INITIALIZED_CLASSVAR = """\
+class MyModel(MyBase):
+    baz: ClassVar[str] = "baz"
+    foo: str = Field(..., description="foo")
+    bar: str
+
+    def method(self) -> None:
+        ...
+
+    @property
+    def myprop(self) -> str:
+        return "myprop"
+
+    class Config:
+        baz = "baz"
+"""
+
+SRC_CUSTOM_BASE_CLASS_WITH_ONLY_BARE_METHODS = """\
+class MyModel(MyBase):
+    foo: str = Field(..., description="foo")
+    bar: str
+
+    def method(self) -> None:
+        ...
+
+    def method2(self) -> None:
+        ...
+"""
+
+SRC_ANNASSIGNS_WITHIN_METHOD = """\
+class MyModel(BaseModel):
+    foo: str = Field(..., description="foo")
+
+    def method(self) -> None:
+        foo: str = "foo"
+        bar: str = "bar"
+"""
+
+SRC_FIELDS_WITHIN_CLASS_LEVEL_BLOCKS = """\
+class MyModel(BaseModel):
+    if TYPE_CHECKING:
+        bar: str
+"""
+
+SRC_CLASSES_WITHIN_FUNCTIONS = """\
+def make_model():
+    class MyModel(BaseModel):
+        bar: str
+
+    return MyModel
+"""
+
+SRC_FIELDS_AFTER_METHODS_AND_INNER_CLASSES = """\
+class MyModel(BaseModel):
+    foo: str = Field(..., description="foo")
+
+    def method(self) -> None:
+        foo: str = "foo"
+
+    class Config:
+        baz: str = "baz"
+
+    bar: str
+"""
+
+SRC_RELATIONSHIP_DEFAULT = """\
+class MyModel(BaseModel):
+    foo: str = Relationship()
+    bar: str
+"""
+
+PLUGIN_CASES = [
+    pytest.param(
+        SRC_FIELDS_WITH_DESCRIPTIONS,
+        EXPECTED_NONE,
+        id="fields-with-descriptions-no-errors",
+    ),
+    pytest.param(
+        SRC_FIELD_WITH_NO_DEFAULT,
+        ((2, 4, PF001_MESSAGE, ""),),
+        id="field-with-no-default-errors",
+    ),
+    pytest.param(
+        SRC_FIELD_WITH_NON_FIELD_DEFAULT,
+        EXPECTED_PF002,
+        id="field-with-non-field-default-errors",
+    ),
+    pytest.param(
+        SRC_LOWERCASE_FIELD_DEFAULT,
+        EXPECTED_PF003,
+        id="lowercase-field-default-checked-as-field",
+    ),
+    pytest.param(
+        SRC_FIELD_WITH_MISSING_DESCRIPTION,
+        EXPECTED_PF003,
+        id="field-with-missing-description-errors",
+    ),
+    pytest.param(
+        SRC_FIELD_WITH_EMPTY_DESCRIPTION,
+        EXPECTED_PF004,
+        id="field-with-empty-description-errors",
+    ),
+    pytest.param(SRC_CLASSVAR, EXPECTED_NONE, id="classvar-skipped"),
+    pytest.param(
+        SRC_CLASSVAR_PREFIXED_ANNOTATION,
+        ((2, 4, PF001_MESSAGE, ""),),
+        id="classvar-prefixed-annotation-not-skipped",
+    ),
+    pytest.param(SRC_PRIVATEATTR, EXPECTED_NONE, id="privateattr-skipped"),
+    pytest.param(SRC_GENERIC_MODEL, EXPECTED_PF001, id="generic-model-identified"),
+    pytest.param(
+        SRC_BASE_CLASS_CONTAINING_PYDANTIC_NAME,
+        EXPECTED_NONE,
+        id="base-class-containing-pydantic-name-not-identified",
+    ),
+    pytest.param(SRC_TYPEDDICT, EXPECTED_NONE, id="typeddict-disregarded"),
+    pytest.param(
+        SRC_CUSTOM_BASE_CLASS_NO_METHODS,
+        EXPECTED_PF001,
+        id="custom-base-class-no-methods-identified",
+    ),
+    pytest.param(
+        SRC_CUSTOM_BASE_CLASS_WITH_VALIDATORS,
+        EXPECTED_PF001,
+        id="custom-base-class-with-validator-identified",
+    ),
+    pytest.param(
+        SRC_CUSTOM_BASE_CLASS_WITH_PYDANTIC_VALIDATORS,
+        EXPECTED_PF001,
+        id="custom-base-class-with-pydantic-validator-identified",
+    ),
+    pytest.param(
+        SRC_CUSTOM_BASE_CLASS_WITH_CONFIG_CLASS,
+        EXPECTED_PF001,
+        id="custom-base-class-with-config-class-identified",
+    ),
+    pytest.param(
+        SRC_CUSTOM_BASE_CLASS_WITH_CONFIG_CLASS_WITH_VALIDATORS,
+        EXPECTED_PF001,
+        id="custom-base-class-with-config-class-with-validators-identified",
+    ),
+    pytest.param(
+        SRC_CUSTOM_BASE_CLASS_WITH_UNINITIALIZED_CLASSVAR,
+        ((4, 4, PF001_MESSAGE, ""),),
+        id="custom-base-class-with-uninitialized-classvar-identified",
+    ),
+    pytest.param(
+        SRC_CUSTOM_BASE_CLASS_WITH_INITIALIZED_CLASSVAR,
+        ((4, 4, PF001_MESSAGE, ""),),
+        id="custom-base-class-with-initialized-classvar-identified",
+    ),
+    pytest.param(
+        SRC_CUSTOM_BASE_CLASS_WITH_ONLY_BARE_METHODS,
+        EXPECTED_PF001,
+        id="custom-base-class-with-only-bare-methods-identified",
+    ),
+    pytest.param(
+        SRC_ANNASSIGNS_WITHIN_METHOD,
+        EXPECTED_NONE,
+        id="annassigns-within-method-ignored",
+    ),
+    pytest.param(
+        SRC_FIELDS_WITHIN_CLASS_LEVEL_BLOCKS,
+        ((3, 8, PF001_MESSAGE, ""),),
+        id="fields-within-class-level-blocks-identified",
+    ),
+    pytest.param(
+        SRC_CLASSES_WITHIN_FUNCTIONS,
+        EXPECTED_NONE,
+        id="classes-within-functions-ignored",
+    ),
+    pytest.param(
+        SRC_FIELDS_AFTER_METHODS_AND_INNER_CLASSES,
+        ((10, 4, PF001_MESSAGE, ""),),
+        id="fields-after-methods-and-inner-classes-identified",
+    ),
+    pytest.param(
+        SRC_RELATIONSHIP_DEFAULT, EXPECTED_NONE, id="relationship-default-disqualifies"
+    ),
+]
+
+
+@pytest.mark.parametrize("source, expected", PLUGIN_CASES)
+def test_plugin_results(
+    source: str, expected: Sequence[tuple[int, int, str, str]]
+) -> None:
+    assert_errors(parse(source), expected)
+
+
+def classdef_is_model_candidate(classdef: ast.ClassDef) -> bool:
+    """Classify a hand-built class node without parsing or walking a module."""
+    annassigns, methods, others = scan_class_body(classdef=classdef)
+    return is_model_candidate(
+        classdef=classdef, annassigns=annassigns, methods=methods, others=others
     )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == []
-
-
-def test_field_with_no_default_errors() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(BaseModel):
-            bar: str
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            2,
-            4,
-            "PF001 Found a Pydantic field which has no default",
-            "",
-        ),
-    ]
-
-
-def test_field_with_non_field_default_errors() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(BaseModel):
-            foo: str = Field(..., description="foo")
-            bar: str = "bar"
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            3,
-            4,
-            "PF002 Found a Pydantic field which has a default that is not a Field",
-            "",
-        ),
-    ]
-
-
-def test_field_with_missing_description_errors() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(BaseModel):
-            foo: str = Field(..., description="foo")
-            bar: str = Field(...)
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            3,
-            4,
-            "PF003 Found a Pydantic field which has a Field default with no description",
-            "",
-        ),
-    ]
-
-
-def test_field_with_empty_description_errors() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(BaseModel):
-            foo: str = Field(..., description="foo")
-            bar: str = Field(..., description="")
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            3,
-            4,
-            "PF004 Found a Pydantic field which has a Field default with an empty description",
-            "",
-        ),
-    ]
-
-
-def test_classvar_skipped() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(BaseModel):
-            foo: ClassVar[str]
-            bar: str = Field(..., description="description")
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == []
-
-
-def test_privateattr_skipped() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(BaseModel):
-            foo: str = PrivateAttr(default=None)
-            bar: str = Field(..., description="description")
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == []
-
-
-def test_generic_model_identified() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(GenericModel):
-            foo: str = Field(..., description="foo")
-            bar: str
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            3,
-            4,
-            "PF001 Found a Pydantic field which has no default",
-            "",
-        ),
-    ]
 
 
 def test_no_base_class_disregarded() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel:
-            foo: str = Field(..., description="foo")
-            bar: str
-        """
+    classdef = ast.ClassDef(
+        name="MyModel", bases=[], keywords=[], body=[], decorator_list=[]
     )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == []
+    assert classdef_is_model_candidate(classdef) is False
 
 
 def test_dataclass_disregarded() -> None:
-    source = inspect.cleandoc(
-        """
-        @dataclass
-        class MyModel:
-            foo: str = Field(..., description="foo")
-            bar: str
-        """
+    classdef = ast.ClassDef(
+        name="MyModel",
+        bases=[ast.Name(id="Base")],
+        keywords=[],
+        body=[],
+        decorator_list=[ast.Name(id="dataclass")],
     )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
+    assert classdef_is_model_candidate(classdef) is False
 
-    assert result == []
 
+SRC_REPEATED_RUNS_ON_SAME_TREE = """\
+class MyModel(BaseModel):
+    foo: str = Field(..., description="foo")
+    bar: str
+"""
 
-def test_typeddict_disregarded() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(TypedDict):
-            foo: str
-            bar: str
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == []
 
+def test_repeated_runs_on_same_tree_walk_once(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    walked = []
+    check_tree = flake8_pydantic_fields._check_tree
 
-def test_custom_base_class_no_methods_identified() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(MyBase):
-            foo: str = Field(..., description="foo")
-            bar: str
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            3,
-            4,
-            "PF001 Found a Pydantic field which has no default",
-            "",
-        ),
-    ]
-
-
-def test_custom_base_class_with_validators_identified() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(MyBase):
-            foo: str = Field(..., description="foo")
-            bar: str
-
-            @validator("foo")
-            def f(cls, v):
-                return v
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            3,
-            4,
-            "PF001 Found a Pydantic field which has no default",
-            "",
-        ),
-    ]
-
-
-def test_custom_base_class_with_pydantic_validators_identified() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(MyBase):
-            foo: str = Field(..., description="foo")
-            bar: str
-
-            @pydantic.validator("foo")
-            def f(cls, v):
-                return v
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            3,
-            4,
-            "PF001 Found a Pydantic field which has no default",
-            "",
-        ),
-    ]
-
-
-def test_custom_base_class_with_config_class_identified() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(MyBase):
-            foo: str = Field(..., description="foo")
-            bar: str
-
-            class Config:
-                pass
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            3,
-            4,
-            "PF001 Found a Pydantic field which has no default",
-            "",
-        ),
-    ]
-
-
-def test_custom_base_class_with_config_class_with_validators_identified() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(MyBase):
-            foo: str = Field(..., description="foo")
-            bar: str
-
-            class Config:
-                @validator("foo")
-                def f(cls, v):
-                    return v
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            3,
-            4,
-            "PF001 Found a Pydantic field which has no default",
-            "",
-        ),
-    ]
-
-
-def test_custom_base_class_with_uninitialized_classvar_identified() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(MyBase):
-            baz: ClassVar[str]
-            foo: str = Field(..., description="foo")
-            bar: str
-
-            def method(self) -> None:
-                ...
-
-            @property
-            def myprop(self) -> str:
-                return "myprop"
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            4,
-            4,
-            "PF001 Found a Pydantic field which has no default",
-            "",
-        ),
-    ]
-
-
-def test_custom_base_class_with_initialized_classvar_identified() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(MyBase):
-            baz: ClassVar[str] = "baz"
-            foo: str = Field(..., description="foo")
-            bar: str
-
-            def method(self) -> None:
-                ...
-
-            @property
-            def myprop(self) -> str:
-                return "myprop"
-
-            class Config:
-                baz = "baz"
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            4,
-            4,
-            "PF001 Found a Pydantic field which has no default",
-            "",
-        ),
-    ]
-
-
-def test_custom_base_class_with_only_bare_methods_identified() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(MyBase):
-            foo: str = Field(..., description="foo")
-            bar: str
-
-            def method(self) -> None:
-                ...
-
-            def method2(self) -> None:
-                ...
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
-
-    assert result == [
-        (
-            3,
-            4,
-            "PF001 Found a Pydantic field which has no default",
-            "",
-        ),
-    ]
-
-
-def test_annassigns_within_method_ignored() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(BaseModel):
-            foo: str = Field(..., description="foo")
-
-            def method(self) -> None:
-                foo: str = "foo"
-                bar: str = "bar"
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
+    def recording_check_tree(tree: ast.Module) -> list[tuple[int, int, str]]:
+        walked.append(tree)
+        return check_tree(tree)
 
-    assert result == []
+    monkeypatch.setattr(flake8_pydantic_fields, "_check_tree", recording_check_tree)
+    tree = ast.parse(SRC_REPEATED_RUNS_ON_SAME_TREE)
+    first = list(Plugin(tree).run())
+    second = list(Plugin(tree).run())
 
+    assert walked == [tree]
+    assert first == second == list(EXPECTED_PF001)
 
-def test_relationship_default_disqualifies() -> None:
-    source = inspect.cleandoc(
-        """
-        class MyModel(BaseModel):
-            foo: str = Relationship()
-            bar: str
-        """
-    )
-    plugin = Plugin(ast.parse(source))
-    result = list(plugin.run())
 
-    assert result == []
+def test_name_lookups_are_frozensets() -> None:
+    assert isinstance(PYDANTIC_MODEL_BASES, frozenset)
+    assert PYDANTIC_MODEL_BASES == {"BaseModel", "GenericModel"}
+    assert isinstance(VALIDATOR_DECORATOR_NAMES, frozenset)
+    assert VALIDATOR_DECORATOR_NAMES == {"validator", "root_validator"}
+    assert isinstance(FIELD_FUNCTION_NAMES, frozenset)
+    assert FIELD_FUNCTION_NAMES == {"Field", "field"}